@@ -1,5 +1,8 @@
 import re
 
+MUL_DO_DONT_PATTERN = re.compile(r"mul\(([0-9]{1,3}),([0-9]{1,3})\)|do\(\)|don't\(\)")
+MAX_TOKEN_LENGTH = len('mul(000,000)')
+
 class MullItOver:
     def __init__(self, filename: str):
         self.input = None
@@ -46,12 +49,62 @@ class MullItOver:
         mul_pairs = [s[4:-1].split(',') for s in included_tokens]
         return MullItOver._calc_mul_pairs(mul_pairs)
 
+    @staticmethod
+    def calc_answers_streaming(filename: str, chunk_size: int = 64 * 1024) -> (int, int):
+        '''
+        Scans the file in fixed-size chunks, calculating both answers in a single pass without holding the whole
+        input in memory. Any partial token at the end of a chunk is carried over and prepended to the next chunk.
+        Tokens cannot overlap (each starts with 'm' or 'd' and ends with ')'), so any match that starts at least
+        MAX_TOKEN_LENGTH-1 characters before the end of the buffer is guaranteed to match the unchunked input.
+
+        :param filename: the corrupted memory dump
+        :param chunk_size: the number of characters to read at a time
+        :return: (answer 1, answer 2)
+        '''
+        assert chunk_size > 0
+        total_1 = 0
+        total_2 = 0
+        include_token = True
+        carry = ''
+
+        with open(filename, 'r') as f:
+            at_end = False
+            while not at_end:
+                chunk = f.read(chunk_size)
+                at_end = (chunk == '')
+                buffer = carry + chunk
+                safe_end = len(buffer) if at_end else len(buffer) - MAX_TOKEN_LENGTH + 1
+                consumed = 0
+
+                for match in MUL_DO_DONT_PATTERN.finditer(buffer):
+                    if match.start() >= safe_end:
+                        break
+
+                    token = match.group(0)
+                    if token == 'do()':
+                        include_token = True
+                    elif token == "don't()":
+                        include_token = False
+                    else:
+                        product = int(match.group(1)) * int(match.group(2))
+                        total_1 += product
+                        if include_token:
+                            total_2 += product
+                    consumed = match.end()
+
+                carry = buffer[max(consumed, safe_end):]
+
+        return total_1, total_2
+
 test1_solution = MullItOver('test1.txt')
 assert test1_solution.calc_answer_1() == 161
 
 test2_solution = MullItOver('test2.txt')
 assert test2_solution.calc_answer_2() == 48
 
+assert MullItOver.calc_answers_streaming('test1.txt', chunk_size=5)[0] == 161
+assert MullItOver.calc_answers_streaming('test2.txt', chunk_size=5)[1] == 48
+
 solution = MullItOver('data.txt')
 
 answer_1 = solution.calc_answer_1()
@@ -7,7 +7,83 @@ M S    S S    S M     M M
 '''
 
 
-import re
+import numpy as np
+
+DIRECTIONS = {
+    'E': (1, 0),
+    'W': (-1, 0),
+    'S': (0, 1),
+    'N': (0, -1),
+    'SE': (1, 1),
+    'NW': (-1, -1),
+    'NE': (1, -1),
+    'SW': (-1, 1),
+}
+
+class AhoCorasick:
+    '''
+    Multi-word matcher. The automaton is fed one character at a time, so it can be driven by any walk over the grid.
+    The failure links are folded into a full transition table once built, so each character is a single lookup.
+    '''
+    def __init__(self, words: [str]):
+        self.words = list(dict.fromkeys(words))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._transitions = []
+        self._build()
+
+    def _build(self):
+        for word_index, word in enumerate(self.words):
+            state = 0
+            for c in word:
+                if c not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][c] = len(self._goto) - 1
+                state = self._goto[state][c]
+            self._output[state].append(word_index)
+
+        queue = list(self._goto[0].values())
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for c, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(c, 0)
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+        # In breadth first order, so the failure state's transitions are always complete first
+        self._transitions = [{} for _ in self._goto]
+        self._transitions[0] = dict(self._goto[0])
+        for state in queue:
+            self._transitions[state] = {**self._transitions[self._fail[state]], **self._goto[state]}
+
+    def step(self, state: int, c: str) -> int:
+        return self._transitions[state].get(c, 0)
+
+    def count_matches(self, cells: str, counts: [int]):
+        '''
+        Feeds the cells through the automaton from the start state, adding the number of matches of each word to
+        counts (indexed as self.words).
+        '''
+        transitions = self._transitions
+        output = self._output
+        state = 0
+        for c in cells:
+            state = transitions[state].get(c, 0)
+            if output[state]:
+                for word_index in output[state]:
+                    counts[word_index] += 1
+
+    def matches(self, state: int) -> [int]:
+        return self._output[state]
+
 
 class CeresSearch:
     def __init__(self, filename: str):
@@ -33,76 +109,135 @@ class CeresSearch:
     def get_row(self, n: int) -> str:
         return self._rows[n]
 
-    def get_column(self, n: int) -> str:
-        return ''.join([row[n] for row in self._rows])
-
-    def _get_cells(self, x: int, y: int, dx: int, dy: int) -> str:
-        xx = x
-        yy = y
-        assert dx != 0 or dy != 0
-
-        s = ''
-        while 0 <= xx < self.width and 0 <= yy < self.height:
-            s += self._rows[yy][xx]
-            xx += dx
-            yy += dy
-
-        return s
-
-    def get_diag_down(self, x: int, y: int) -> str:
-        return self._get_cells(x, y, 1, 1)
-
-    def get_diag_up(self, x: int, y: int) -> str:
-        return self._get_cells(x, y, 1, -1)
-
-    def get_columns(self) -> [str]:
-        return [self.get_column(n) for n in range(0, self.width)]
-
     def get_rows(self) -> [str]:
         return self._rows
 
-    def get_diags_down(self) -> [str]:
-        d1 = [self.get_diag_down(0, y) for y in range(1,self.height)]
-        d2 = [self.get_diag_down(x, 0) for x in range(0, self.width)]
-        d1.extend(d2)
-        return d1
-
-    def get_diags_up(self) -> [str]:
-        d1 = [self.get_diag_up(0, y) for y in range(0,self.height-1)]
-        d2 = [self.get_diag_up(x, self.height-1) for x in range(0, self.width)]
-        d1.extend(d2)
-        return d1
+    def find_word(self, word: str) -> int:
+        '''
+        Counts the occurrences of the word in all eight directions. Occurrences may overlap (e.g. 'AA' is found twice
+        reading 'AAA' left to right), unlike the earlier re.findall() search of each line, which only counted
+        non-overlapping matches. The counts are the same for words that can't overlap themselves, such as 'XMAS'.
+        '''
+        return sum(self.find_words([word])[word].values())
+
+    def _get_line_starts(self, dx: int, dy: int) -> [(int, int)]:
+        '''
+        Returns the cells from which a walk in direction (dx, dy) covers a whole line of the grid, i.e. the cells
+        whose predecessor in that direction is off the grid.
+        '''
+        starts = {}
+        if dx:
+            x = 0 if dx == 1 else self.width - 1
+            starts.update(dict.fromkeys((x, y) for y in range(0, self.height)))
+        if dy:
+            y = 0 if dy == 1 else self.height - 1
+            starts.update(dict.fromkeys((x, y) for x in range(0, self.width)))
+        return list(starts)
+
+    def _get_line_length(self, x: int, y: int, dx: int, dy: int) -> int:
+        steps_x = self.width - x if dx == 1 else x + 1 if dx == -1 else self.width * self.height
+        steps_y = self.height - y if dy == 1 else y + 1 if dy == -1 else self.width * self.height
+        return min(steps_x, steps_y)
+
+    def find_words(self, words: [str]) -> {str: {str: int}}:
+        '''
+        Counts every occurrence of each word in all eight directions in a single walk per direction. Each line of the
+        grid is a strided slice of the flat cells (start, stop and stride are calculated directly, rather than
+        building the line a cell at a time), fed to an Aho-Corasick automaton so all words are matched at once.
+
+        :param words: the words to search for
+        :return: a dictionary of word -> {direction -> count}
+        '''
+        automaton = AhoCorasick(words)
+        cells = ''.join(self._rows)
+        counts = {word: {} for word in automaton.words}
+
+        for direction, (dx, dy) in DIRECTIONS.items():
+            stride = dy * self.width + dx
+            direction_counts = [0] * len(automaton.words)
+            for (x, y) in self._get_line_starts(dx, dy):
+                start = y * self.width + x
+                length = self._get_line_length(x, y, dx, dy)
+                if length == 1:  # Includes the case of a single column, where a diagonal stride can be 0
+                    line = cells[start]
+                else:
+                    stop = start + length * stride
+                    line = cells[start:stop if stop >= 0 else None:stride]
+                automaton.count_matches(line, direction_counts)
+
+            for word, count in zip(automaton.words, direction_counts):
+                counts[word][direction] = count
+
+        return counts
+
+    def get_grid(self) -> np.ndarray:
+        return np.frombuffer(''.join(self._rows).encode(), dtype=np.uint8).reshape(self.height, self.width)
 
     @staticmethod
-    def _find_match(word: str, array: [str]):
-        matches = []
-        for w in array:
-            matches.extend(re.findall(word, w))
-            matches.extend(re.findall(word, w[::-1]))
+    def generate_templates(template: [str], wildcard: str = '.', include_transforms: bool = True) -> [np.ndarray]:
+        '''
+        Converts a template into a uint8 array (wildcards are 0) and, optionally, generates all of its distinct
+        rotations and reflections.
+
+        :param template: the rows of the template, e.g. ['M.S', '.A.', 'M.S']
+        :param wildcard: the character in the template that matches any cell
+        :param include_transforms: True to include the rotations and reflections of the template
+        :return: a list of distinct templates
+        '''
+        assert len(set(len(row) for row in template)) == 1
+        base = np.frombuffer(''.join(template).encode(), dtype=np.uint8).reshape(len(template), len(template[0]))
+        base = np.where(base == ord(wildcard), 0, base).astype(np.uint8)
+
+        candidates = [base]
+        if include_transforms:
+            candidates = [np.rot90(t, k) for t in [base, np.fliplr(base)] for k in range(0, 4)]
+
+        templates = []
+        seen = set()
+        for t in candidates:
+            key = (t.shape, t.tobytes())
+            if key not in seen:
+                seen.add(key)
+                templates.append(np.ascontiguousarray(t))
+
+        return templates
 
-        return matches
+    @staticmethod
+    def _count_template_matches(grid: np.ndarray, template: np.ndarray) -> int:
+        (th, tw) = template.shape
+        (h, w) = grid.shape
+        if th > h or tw > w:
+            return 0
 
+        mask = np.ones((h - th + 1, w - tw + 1), dtype=bool)
+        for (ty, tx) in zip(*np.nonzero(template)):
+            mask &= grid[ty:ty + h - th + 1, tx:tx + w - tw + 1] == template[ty, tx]
 
-    def find_word(self, word: str) -> int:
-        matches_rows = CeresSearch._find_match(word, self.get_rows())
-        matches_cols = CeresSearch._find_match(word, self.get_columns())
-        matches_diag_up = CeresSearch._find_match(word, self.get_diags_up())
-        matches_diag_down = CeresSearch._find_match(word, self.get_diags_down())
+        return int(np.count_nonzero(mask))
 
-        return len(matches_rows) + len(matches_cols) + len(matches_diag_up) + len(matches_diag_down)
+    def find_template(self, template: [str], wildcard: str = '.', include_transforms: bool = True) -> int:
+        '''
+        Counts the positions at which a 2D template matches the grid. Each template cell is compared against a
+        shifted slice of the whole grid, so the number of passes depends on the template size, not the grid size.
 
-    # def generate_templates(self, word: str):
-    #     templates = []
-    #
-    #     for i in range(0, 4):
-    #         for r
+        :param template: the rows of the template, e.g. ['M.S', '.A.', 'M.S']
+        :param wildcard: the character in the template that matches any cell
+        :param include_transforms: True to also count matches of the distinct rotations and reflections
+        :return: the number of matches
+        '''
+        grid = self.get_grid()
+        return sum(CeresSearch._count_template_matches(grid, t)
+                   for t in CeresSearch.generate_templates(template, wildcard, include_transforms))
 
 
 test_solution = CeresSearch('test.txt')
 assert test_solution.find_word('XMAS') == 18
+assert sum(test_solution.find_words(['XMAS', 'SAMX'])['SAMX'].values()) == 18
+assert test_solution.find_template(['M.S', '.A.', 'M.S']) == 9
 
 solution = CeresSearch('data.txt')
 answer_1 = solution.find_word('XMAS')
 print(f'Part 1 Answer: {answer_1}')
 
-# ToDo: Part 2
\ No newline at end of file
+answer_2 = solution.find_template(['M.S', '.A.', 'M.S'])
+print(f'Part 2 Answer: {answer_2}')
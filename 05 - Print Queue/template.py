@@ -1,9 +1,69 @@
-import copy
+import heapq
+from collections import OrderedDict
+from typing import Optional
+
+class PageSetOrdering:
+    '''
+    The corrected ordering of a set of pages. The corrected order only depends on the set of pages (not the order
+    they were in), so it applies to every update of the same set. is_total_order is True if the rules allow no other
+    order.
+    '''
+    def __init__(self, corrected_order: (int,), is_total_order: bool):
+        self.corrected_order = corrected_order
+        self.is_total_order = is_total_order
+        self.middle_page = corrected_order[len(corrected_order) // 2]
+
+
+class PageSetCache:
+    '''
+    LRU cache of the corrected ordering for each distinct set of pages. Updates frequently repeat the same set of
+    pages, so the ordering only needs to be derived from the rules once per set.
+    '''
+    def __init__(self, max_size: int = 1024):
+        assert max_size > 0
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return f'PageSetCache(size={len(self)}/{self.max_size}, hits={self.hits}, misses={self.misses})'
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, page_set: frozenset) -> Optional[PageSetOrdering]:
+        ordering = self._entries.get(page_set)
+        if ordering is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(page_set)
+        return ordering
+
+    def put(self, page_set: frozenset, ordering: PageSetOrdering):
+        self._entries[page_set] = ordering
+        self._entries.move_to_end(page_set)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
 
 class PrintQueue:
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, cache_size: int = 1024):
         self.page_ordering_rules = []
+        self.pages_after = {}
         self.required_pages = []
+        self.page_set_cache = PageSetCache(cache_size)
         self._load_data(filename)
 
     def _load_data(self, filename: str):
@@ -15,10 +75,15 @@ class PrintQueue:
                     continue
 
                 if load_stage == 'PAGE_ORDERING_RULES':
-                    self.page_ordering_rules.append([int(x) for x in row.strip().split('|')])
+                    (page_lower, page_higher) = [int(x) for x in row.strip().split('|')]
+                    self.add_rule(page_lower, page_higher)
                 elif load_stage == 'PAGES_REQUIRED':
                     self.required_pages.append([int(x) for x in row.strip().split(',')])
 
+    def add_rule(self, page_lower: int, page_higher: int):
+        self.page_ordering_rules.append([page_lower, page_higher])
+        self.pages_after.setdefault(page_lower, set()).add(page_higher)
+
     def _validate_required_pages(self, required_pages: [int]) -> bool:
         '''
         Validates that the pages to be printed are ordered according to the rules. Any rule related to pages
@@ -27,16 +92,15 @@ class PrintQueue:
         :param required_pages: the list of pages to be printed
         :return: True if the pages are ordered according to the rules
         '''
-        error_found = False
-        for rule in self.page_ordering_rules:
-            (page_lower, page_higher) = rule
-            if page_lower in required_pages and page_higher in required_pages:
-                (index_lower, index_higher) = (required_pages.index(page_lower), required_pages.index(page_higher))
-                if index_lower > index_higher:
-                    error_found = True
-                    break
+        for i, page in enumerate(required_pages):
+            pages_after = self.pages_after.get(page)
+            if pages_after is None:
+                continue
+            for earlier_page in required_pages[:i]:
+                if earlier_page in pages_after:
+                    return False
 
-        return not error_found
+        return True
 
     def get_correct_order_total(self) -> int:
         '''
@@ -48,29 +112,78 @@ class PrintQueue:
         correct_order_total = 0
 
         for required_pages in self.required_pages:
-            if self._validate_required_pages(required_pages):
+            if self._is_correctly_ordered(required_pages, self.get_page_set_ordering(required_pages)):
                 correct_order_total += required_pages[len(required_pages) // 2]
 
         return correct_order_total
 
-    def correct_some_incorrect_pages(self, required_pages: [int]) -> [int]:
+    def _compare_pages(self, page_a: int, page_b: int) -> int:
+        if page_b in self.pages_after.get(page_a, ()):
+            return -1
+        if page_a in self.pages_after.get(page_b, ()):
+            return 1
+        return 0
+
+    def correct_pages(self, required_pages: [int]) -> [int]:
         '''
-        Moves pages to be printed that are not in the correct position according to the rules. Note, that multiple
-        passes may be required to completely correct all pages out of position.
+        Sorts the pages to be printed with a topological sort (Kahn's algorithm) of the rules between them. A page is
+        taken once every page that must come before it has been taken, and pages with no rule between them are taken
+        in page number order, so the result only depends on the set of pages.
 
         :param required_pages: A set of pages required to be printed
-        :return: The list of pages to be printed, with some (but potentially not all) pages moved to correct positions
+        :return: The list of pages to be printed, in the correct order
         '''
-        required_pages = copy.copy(required_pages)
-        for rule in self.page_ordering_rules:
-            (page_lower, page_higher) = rule
-            if page_lower in required_pages and page_higher in required_pages:
-                (index_lower, index_higher) = (required_pages.index(page_lower), required_pages.index(page_higher))
-                if index_lower > index_higher:
-                    required_pages.pop(index_lower)
-                    required_pages.insert(index_higher, page_lower)
-                    pass
-        return required_pages
+        pages = set(required_pages)
+        earlier_page_counts = {page: 0 for page in pages}
+        for page in pages:
+            for later_page in self.pages_after.get(page, ()):
+                if later_page in pages:
+                    earlier_page_counts[later_page] += 1
+
+        ready = [page for page, count in earlier_page_counts.items() if count == 0]
+        heapq.heapify(ready)
+        corrected_pages = []
+        while ready:
+            page = heapq.heappop(ready)
+            corrected_pages.append(page)
+            for later_page in self.pages_after.get(page, ()):
+                if later_page in pages:
+                    earlier_page_counts[later_page] -= 1
+                    if earlier_page_counts[later_page] == 0:
+                        heapq.heappush(ready, later_page)
+
+        if len(corrected_pages) != len(pages):
+            raise ValueError(f'The rules for pages {required_pages} contain a cycle')
+
+        return corrected_pages
+
+    def get_page_set_ordering(self, required_pages: [int]) -> PageSetOrdering:
+        '''
+        Returns the corrected ordering for the set of pages, deriving it from the rules only the first time the set
+        is seen.
+
+        :param required_pages: A set of pages required to be printed
+        :return: The corrected ordering and middle page for the set of pages
+        '''
+        page_set = frozenset(required_pages)
+        ordering = self.page_set_cache.get(page_set)
+        if ordering is None:
+            corrected_order = tuple(self.correct_pages(required_pages))
+            is_total_order = all(self._compare_pages(corrected_order[i], corrected_order[i + 1]) == -1
+                                 for i in range(0, len(corrected_order) - 1))
+            ordering = PageSetOrdering(corrected_order, is_total_order)
+            self.page_set_cache.put(page_set, ordering)
+
+        return ordering
+
+    def _is_correctly_ordered(self, required_pages: [int], ordering: PageSetOrdering) -> bool:
+        '''
+        When the rules fully order the set of pages there is only one correct order, so validation is a comparison
+        against the cached ordering. Otherwise, the pages are validated against the rules.
+        '''
+        if ordering.is_total_order:
+            return tuple(required_pages) == ordering.corrected_order
+        return self._validate_required_pages(required_pages)
 
     def get_corrected_order_total(self) -> int:
         '''
@@ -82,15 +195,9 @@ class PrintQueue:
         corrected_order_count = 0
 
         for required_pages in self.required_pages:
-            if not self._validate_required_pages(required_pages):
-                keep_going = True
-
-                while keep_going:
-                    new_pages = self.correct_some_incorrect_pages(required_pages)
-                    keep_going = (required_pages != new_pages)
-                    required_pages = new_pages
-
-                corrected_order_count += required_pages[len(required_pages) // 2]
+            ordering = self.get_page_set_ordering(required_pages)
+            if not self._is_correctly_ordered(required_pages, ordering):
+                corrected_order_count += ordering.middle_page
 
         return corrected_order_count
 
@@ -103,6 +210,9 @@ class PrintQueue:
 test_solution = PrintQueue('test.txt')
 assert test_solution.get_answer_1() == 143
 assert test_solution.get_answer_2() == 123
+assert (test_solution.page_set_cache.hits, test_solution.page_set_cache.misses) == (6, 6)
+test_solution.add_rule(1, 3)
+assert test_solution.correct_pages([3, 2, 1]) == [1, 2, 3]
 
 solution_1 = PrintQueue('data.txt')
 answer_1 = solution_1.get_answer_1()
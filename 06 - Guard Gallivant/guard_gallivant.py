@@ -24,6 +24,9 @@ significantly speeding up the process of creating the guard's route.
 
 '''
 
+import os
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import Optional
 
@@ -108,14 +111,41 @@ class GuardPathStep:
 
 
 class GuardPath:
+    '''
+    The guard's route, stored as one bit per (x, y, direction) at bit index (y*width + x)*4 + direction. As the four
+    directions of a location share a nibble, the nibble is also the location's direction mask used for rendering.
+    '''
     multi_path_symbol = '+'
-    def __init__(self):
-        self.path = []
-        self.steps_cache = {}  # Cache of 'x|y|d' dictionary items to aid faster lookup
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.step_count = 0
+        self._steps = bytearray((width * height * 4 + 7) // 8)
+
+    def _get_bit_index(self, x: int, y: int, d: str) -> int:
+        return (y * self.width + x) * 4 + GuardPathStep.directions.index(d)
 
     def add_step(self, step: GuardPathStep):
-        self.path.append(step)
-        self.steps_cache[str(step)] = True  # Cache a string version of the step for faster lookup
+        self.add_position(step.x, step.y, step.direction)
+
+    def add_position(self, x: int, y: int, d: str) -> bool:
+        '''
+        Adds a step to the path.
+
+        :return: False if the step was already in the path (implying a loop), otherwise True
+        '''
+        i = self._get_bit_index(x, y, d)
+        bit = 1 << (i & 7)
+        if self._steps[i >> 3] & bit:
+            return False
+
+        self._steps[i >> 3] |= bit
+        self.step_count += 1
+        return True
+
+    def get_direction_mask(self, x: int, y: int) -> int:
+        cell = y * self.width + x
+        return (self._steps[cell >> 1] >> ((cell & 1) * 4)) & 0xF
 
     def get_symbol(self, x: int, y: int) -> str|None:
         '''
@@ -126,39 +156,97 @@ class GuardPath:
         :param y: Y location
         :return: '|', '-' or '+' (if multiple steps overlap the same locations)
         '''
-        steps: [GuardPathStep] = [step for step in self.path if (step.x, step.y) == (x,y)]
-        if len(steps) > 1:
+        mask = self.get_direction_mask(x, y)
+        if mask & (mask - 1):
             return GuardPath.multi_path_symbol
-        elif len(steps) == 1:
-            return steps[0].get_symbol()
+        elif mask:
+            return GuardPathStep.path_symbols[mask.bit_length() - 1]
         else:
             return None
 
     def has_step(self, x: int, y: int, d: str) -> bool:
         '''
-        Uses the cached string representation of the path to determine if the specified location (x,y) and direction (d)
-        already exist. If they already exist, this implies a loop condition (which can be identified and raised as an
-        exception by the caller.
+        Determines if the specified location (x,y) and direction (d) already exist. If they already exist, this implies
+        a loop condition (which can be identified and raised as an exception by the caller.
 
         :param x: X location
         :param y: Y location
         :param d: Direction (N,S,E,W)
         :return: True if the position and direction already exists in the path, otherwise False
         '''
-        # Unoptimized version...
-        #steps = [s for s in self.path if s.x == x and s.y == y and s.direction == d]
-        #return len(steps) > 0
-
-        # Optimized Version...
-        return f'{x}|{y}|{d}' in self.steps_cache
+        i = self._get_bit_index(x, y, d)
+        return bool(self._steps[i >> 3] & (1 << (i & 7)))
 
     def find_steps_at_position(self, x: int, y):
-        steps = [s for s in self.path if s.x == x and s.y == y]
-        return steps
+        mask = self.get_direction_mask(x, y)
+        return [GuardPathStep(x, y, d) for i, d in enumerate(GuardPathStep.directions) if mask & (1 << i)]
 
     def find_distinct_positions(self):
-        positions = [(p.x, p.y) for p in self.path]
-        return list(set(positions))
+        positions = []
+        for i, b in enumerate(self._steps):
+            if b:
+                for cell in (2 * i, 2 * i + 1):
+                    if (b >> ((cell & 1) * 4)) & 0xF:
+                        positions.append((cell % self.width, cell // self.width))
+        return positions
+
+class ObstacleJumpTable:
+    '''
+    Sorted obstruction positions for each row and column, used to move the guard from one obstruction to the next in
+    a single lookup rather than one cell at a time. A single temporary obstruction can be taken into account without
+    rebuilding the table.
+    '''
+    def __init__(self, width: int, height: int, obstructions: [(int, int)]):
+        self.rows: [[int]] = [[] for _ in range(0, height)]
+        self.columns: [[int]] = [[] for _ in range(0, width)]
+
+        for (x, y) in sorted(obstructions, key=lambda p: (p[1], p[0])):
+            self.rows[y].append(x)
+        for (x, y) in sorted(obstructions):
+            self.columns[x].append(y)
+
+    @staticmethod
+    def _find_nearest(line: [int], p: int, forward: bool, extra: int|None) -> int|None:
+        '''
+        Finds the nearest obstruction on a row/column ahead of position p.
+
+        :param line: The sorted obstruction positions along the row/column
+        :param p: The current position along the row/column
+        :param forward: True if moving towards higher positions (E or S)
+        :param extra: The position of a temporary obstruction on the same row/column, if any
+        :return: The position of the nearest obstruction, or None if there are no obstructions ahead
+        '''
+        if forward:
+            i = bisect_right(line, p)
+            nearest = line[i] if i < len(line) else None
+            if extra is not None and extra > p and (nearest is None or extra < nearest):
+                nearest = extra
+        else:
+            i = bisect_left(line, p) - 1
+            nearest = line[i] if i >= 0 else None
+            if extra is not None and extra < p and (nearest is None or extra > nearest):
+                nearest = extra
+        return nearest
+
+    def next_stop(self, x: int, y: int, d: str, obstruction: Optional[tuple[int, int]] = None) -> Optional[tuple[int, int]]:
+        '''
+        Determines where the guard stops when walking from (x,y) in direction d.
+
+        :param x: X location
+        :param y: Y location
+        :param d: Direction (N, S, E, W)
+        :param obstruction: Optional temporary obstruction (x,y)
+        :return: The location in front of the next obstruction, or None if the guard walks off the map
+        '''
+        if d in ('N', 'S'):
+            extra = obstruction[1] if obstruction and obstruction[0] == x else None
+            nearest = ObstacleJumpTable._find_nearest(self.columns[x], y, d == 'S', extra)
+            return None if nearest is None else (x, nearest - 1 if d == 'S' else nearest + 1)
+        else:
+            extra = obstruction[0] if obstruction and obstruction[1] == y else None
+            nearest = ObstacleJumpTable._find_nearest(self.rows[y], x, d == 'E', extra)
+            return None if nearest is None else (nearest - 1 if d == 'E' else nearest + 1, y)
+
 
 class GuardGallivant:
     guard_symbols = ['^', 'v', '>', '<']  # The examples only include '^', but assume all directions are possible.
@@ -168,6 +256,7 @@ class GuardGallivant:
         self.guard_start_position: (int,int) = None
         self.guard_start_direction: str|None = None
         self._load_data(filename)
+        self.jump_table = self._build_jump_table()
         self._debug = debug
 
     @property
@@ -205,6 +294,10 @@ class GuardGallivant:
 
                 self.map.append(map_row)
 
+    def _build_jump_table(self) -> ObstacleJumpTable:
+        obstructions = [(cell.x, cell.y) for row in self.map for cell in row if cell.is_obstruction]
+        return ObstacleJumpTable(self.width, self.height, obstructions)
+
     def get_symbol(self, x: int, y: int, guard_path: GuardPath|None=None) -> str:
         '''
 
@@ -234,34 +327,68 @@ class GuardGallivant:
         (x1, y1) = (x+dx, y+dy)
         return self.is_on_map(x1, y1) and self.map[y1][x1].is_obstruction
 
-    def _generate_guard_path(self) -> GuardPath:
+    def _generate_guard_path(self, checkpoints: dict|None = None) -> GuardPath:
         '''
         Follows the path of the guard, turning right if an obstruction is found until the guard leaves the map or
         ends up in the starting location and direction (indicating a loop), in which case, a LoopFound exception is
         generated. We could take a parameter to not raise the exception if the route (including loops) are required.
 
+        :param checkpoints: Optional dictionary, populated with (x,y) -> ((x,y), d), the guard's location and
+                            direction immediately before first stepping onto each location (other than the start).
         :return: A GuardPath object containing the path of the guard. If a loop is detected, then a LoopFound exception
                  is raised.
         '''
 
-        guard_path = GuardPath()
+        guard_path = GuardPath(self.width, self.height)
         (x,y) = self.guard_start_position
         d = self.guard_start_direction
 
         while self.is_on_map(x, y):
-            if guard_path.has_step(x, y, d):
+            if not guard_path.add_position(x, y, d):
                 raise LoopFound()
-            else:
-                guard_path.add_step(GuardPathStep(x=x, y=y, direction=d))
 
             if self.is_blocked(x, y, d):
                 d = GuardPathStep.turn_right[GuardPathStep.directions.index(d)]
             else:
                 (dx, dy) = GuardPathStep.deltas[GuardPathStep.directions.index(d)]
+                if checkpoints is not None and (x+dx, y+dy) not in checkpoints:
+                    checkpoints[(x+dx, y+dy)] = ((x, y), d)
                 (x, y) = (x+dx, y+dy)
 
         return guard_path
 
+    def is_loop(self, obstruction: Optional[tuple[int, int]] = None) -> bool:
+        '''
+        Follows the guard from obstruction to obstruction using the jump table, so the cost depends on the number of
+        turns rather than the length of the path. The guard is in a loop if it turns at the same location and
+        direction twice.
+
+        :param obstruction: Optional temporary obstruction (x,y). The map is not modified.
+        :return: True if the guard never leaves the map
+        '''
+        return GuardGallivant._is_loop(self.jump_table, self.guard_start_position, self.guard_start_direction,
+                                       obstruction)
+
+    @staticmethod
+    def _is_loop(jump_table: ObstacleJumpTable,
+                 start_position: (int, int),
+                 start_direction: str,
+                 obstruction: Optional[tuple[int, int]]) -> bool:
+        (x, y) = start_position
+        d = start_direction
+        turns = set()
+
+        while True:
+            stop = jump_table.next_stop(x, y, d, obstruction)
+            if stop is None:
+                return False
+
+            (x, y) = stop
+            d = GuardPathStep.turn_right[GuardPathStep.directions.index(d)]
+            if (x, y, d) in turns:
+                return True
+            turns.add((x, y, d))
+
     def get_answer_1(self) -> int:
         t0 = datetime.now()
         guard_path = self._generate_guard_path()
@@ -274,24 +401,75 @@ class GuardGallivant:
 
         return len(guard_path.find_distinct_positions())
 
-    def get_answer_2(self) -> int:
-        guard_path = self._generate_guard_path()
-        distinct_positions = guard_path.find_distinct_positions()
+    def _get_obstruction_candidates(self) -> [((int, int), (int, int), str)]:
+        '''
+        The guard's route up to the first time it reaches a location is unaffected by placing an obstruction there,
+        so each loop check can resume from the step before that location rather than from the guard's start.
+
+        :return: A list of (obstruction, resume position, resume direction) for each location visited by the guard,
+                 excluding the start position (where an obstruction is not allowed)
+        '''
+        checkpoints = {}
+        self._generate_guard_path(checkpoints=checkpoints)
+        checkpoints.pop(self.guard_start_position, None)
+        return [(obstruction, position, d) for obstruction, (position, d) in checkpoints.items()
+                if self.is_on_map(*obstruction)]
+
+    @staticmethod
+    def _report_progress(checked: int, total: int, last_percent: int) -> int:
+        '''
+        Prints progress only when the percentage changes, so large maps don't spend their time writing to stdout.
 
-        # Remove the start position from the possible locations for the obstruction, as this is not allowed
-        distinct_positions.pop(distinct_positions.index(self.guard_start_position))
+        :return: The percentage reported (or the previously reported percentage)
+        '''
+        percent = int(100 * checked / total) if total else 100
+        if percent != last_percent:
+            print(f'Checking {checked} of {total} {percent}% ...', end='\r')
+        return percent
 
-        loop_count = 0
-        for i, (x,y) in enumerate(distinct_positions):
-            print(f'Checking {i} of {len(distinct_positions)} {int(100*i/len(distinct_positions))}% ...', end='\r')
-            self.map[y][x].set_temporary_obstruction()
+    def get_answer_2(self, processes: int|None = None) -> int:
+        '''
+        Counts the positions where one additional obstruction causes the guard to loop.
+
+        :param processes: None (or 1) to check each candidate in this process, otherwise the number of worker
+                          processes to spread the candidates across (0 to use all cores)
+        :return: The number of obstruction positions that cause a loop
+        '''
+        if processes is not None and processes != 1:
+            return self._get_answer_2_parallel(processes or os.cpu_count())
 
-            try:
-                _ = self._generate_guard_path()
-            except LoopFound:
+        candidates = self._get_obstruction_candidates()
+
+        loop_count = 0
+        last_percent = -1
+        for i, (obstruction, resume_position, resume_direction) in enumerate(candidates):
+            last_percent = GuardGallivant._report_progress(i, len(candidates), last_percent)
+            if GuardGallivant._is_loop(self.jump_table, resume_position, resume_direction, obstruction):
                 loop_count += 1
 
-            self.map[y][x].unset_temporary_obstruction()
+        return loop_count
+
+    def _get_answer_2_parallel(self, processes: int, chunks_per_process: int = 4) -> int:
+        '''
+        Partitions the candidate obstructions into chunks and checks them across a process pool. The jump table is
+        sent to each worker once, and each candidate obstruction is passed as a parameter, so no worker writes to
+        shared state. The loop counts from each chunk are summed at the end.
+        '''
+        candidates = self._get_obstruction_candidates()
+        chunk_count = max(1, min(len(candidates), processes * chunks_per_process))
+        chunks = [candidates[i::chunk_count] for i in range(0, chunk_count)]
+
+        loop_count = 0
+        checked = 0
+        last_percent = -1
+        with ProcessPoolExecutor(max_workers=processes,
+                                 initializer=_init_loop_worker,
+                                 initargs=(self.jump_table,)) as executor:
+            futures = {executor.submit(_count_loops, chunk): len(chunk) for chunk in chunks}
+            for future in as_completed(futures):
+                loop_count += future.result()
+                checked += futures[future]
+                last_percent = GuardGallivant._report_progress(checked, len(candidates), last_percent)
 
         return loop_count
 
@@ -303,14 +481,29 @@ class GuardGallivant:
         return self.as_string()
 
 
-test_solution = GuardGallivant('test.txt')
-assert test_solution.get_answer_1() == 41
-assert test_solution.get_answer_2() == 6
+# Worker process state for the parallel version of Part 2. Set once per worker by the pool initializer.
+_worker_jump_table: ObstacleJumpTable|None = None
+
+def _init_loop_worker(jump_table: ObstacleJumpTable):
+    global _worker_jump_table
+    _worker_jump_table = jump_table
+
+def _count_loops(candidates: [((int, int), (int, int), str)]) -> int:
+    return sum(1 for (obstruction, resume_position, resume_direction) in candidates
+               if GuardGallivant._is_loop(_worker_jump_table, resume_position, resume_direction, obstruction))
+
+
+if __name__ == '__main__':
+    # The guard is required so that worker processes (which re-import this module) don't re-run the solution.
+    test_solution = GuardGallivant('test.txt')
+    assert test_solution.get_answer_1() == 41
+    assert test_solution.get_answer_2() == 6
+    assert GuardGallivant('test.txt').get_answer_2(processes=2) == 6
 
-solution_1 = GuardGallivant('data.txt')
-answer_1 = solution_1.get_answer_1()
-print(f'Task 1 Answer: {answer_1}')
+    solution_1 = GuardGallivant('data.txt')
+    answer_1 = solution_1.get_answer_1()
+    print(f'Task 1 Answer: {answer_1}')
 
-solution_2 = GuardGallivant('data.txt')
-answer_2 = solution_2.get_answer_2()
-print(f'Task 2 Answer: {answer_2}')
\ No newline at end of file
+    solution_2 = GuardGallivant('data.txt')
+    answer_2 = solution_2.get_answer_2(processes=0)
+    print(f'Task 2 Answer: {answer_2}')
\ No newline at end of file
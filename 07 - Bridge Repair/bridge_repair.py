@@ -1,9 +1,20 @@
 import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
 class Equation:
     OPERATORS_1 = ['*', '+']
     OPERATORS_2 = ['*', '+', '||']
 
+    # Used by solve_forwards(). Additional operators can be registered here, provided they never reduce the total
+    # (other than '*' by a zero value, which solve_forwards() handles itself).
+    OPERATOR_FUNCTIONS = {
+        '*': lambda a, b: a * b,
+        '+': lambda a, b: a + b,
+        '||': lambda a, b: a * Equation._get_concatenation_multiplier(b) + b,
+    }
+
     def __init__(self, answer: int, values:[int]):
         self.answer = answer
         self.values = values
@@ -29,9 +40,105 @@ class Equation:
 
         return False
 
+    @staticmethod
+    def _get_concatenation_multiplier(value: int) -> int:
+        multiplier = 10
+        while multiplier <= value:
+            multiplier *= 10
+        return multiplier
+
+    def solve_backwards(self, all_operators: [str], target: int|None = None, i: int|None = None) -> bool:
+        '''
+        Works backwards from the answer, undoing the last operator at each step. An operator can only be undone if
+        the result could have been produced by it (e.g. '*' requires the target to be divisible by the value), so
+        impossible branches are pruned immediately rather than evaluated in full. Assumes all values are
+        non-negative, as the operators can then never reduce the total.
+
+        :param all_operators: The operators that may be used
+        :param target: The total required after applying the operator to value i (defaults to the answer)
+        :param i: The index of the last value in the sub-expression (defaults to the last value)
+        :return: True if the values up to i can be combined to produce the target
+        '''
+        if target is None:
+            (target, i) = (self.answer, len(self.values) - 1)
+
+        if i == 0:
+            return target == self.values[0]
+
+        value = self.values[i]
+        for operator in all_operators:
+            if operator == '+':
+                if target >= value and self.solve_backwards(all_operators, target - value, i - 1):
+                    return True
+            elif operator == '*':
+                if value == 0:
+                    if target == 0:
+                        return True
+                elif target % value == 0 and self.solve_backwards(all_operators, target // value, i - 1):
+                    return True
+            elif operator == '||':
+                multiplier = Equation._get_concatenation_multiplier(value)
+                if target % multiplier == value and self.solve_backwards(all_operators, target // multiplier, i - 1):
+                    return True
+            else:
+                raise ValueError(f'operator {operator} not supported')
+
+        return False
+
+    def _get_reachable_layers(self, all_operators: (str,)) -> [{int: Optional[tuple[Optional[int], str]]}]:
+        '''
+        Returns, for each value, every total (not exceeding the answer) that the values up to it can produce, mapped to
+        the previous total and operator that first produced it. Each total is kept once, however many operator
+        assignments produce it.
+
+        Multiplying by a zero value is the one way the total can be reduced, and it produces 0 whatever the previous
+        total was, including totals already dropped for exceeding the answer. So 0 is always reachable after a zero
+        value (if '*' is allowed), with None as its previous total, meaning any assignment of the earlier operators.
+        '''
+        layers = [{self.values[0]: None} if self.values[0] <= self.answer else {}]
+        for value in self.values[1:]:
+            totals = {}
+            for previous_total in layers[-1]:
+                for operator in all_operators:
+                    if operator not in Equation.OPERATOR_FUNCTIONS:
+                        raise ValueError(f'operator {operator} not supported')
+                    total = Equation.OPERATOR_FUNCTIONS[operator](previous_total, value)
+                    if total <= self.answer and total not in totals:
+                        totals[total] = (previous_total, operator)
+
+            if value == 0 and '*' in all_operators and 0 <= self.answer and 0 not in totals:
+                totals[0] = (None, '*')
+            layers.append(totals)
+
+        return layers
+
+    def solve_forwards(self, all_operators: [str]) -> Optional[list[str]]:
+        '''
+        Evaluates the equation breadth-first, keeping the set of reachable totals after each value. As the operators
+        never reduce the total (assuming non-negative values, and other than multiplying by zero), any total above the
+        answer is dropped immediately. The layers are only kept for the duration of the call.
+
+        :param all_operators: The operators that may be used (keys of OPERATOR_FUNCTIONS)
+        :return: The operators that produce the answer, or None if the equation cannot be solved
+        '''
+        all_operators = tuple(all_operators)
+        layers = self._get_reachable_layers(all_operators)
+        last = len(self.values) - 1
+        if self.answer not in layers[last]:
+            return None
+
+        operators = []
+        total = self.answer
+        for i in range(last, 0, -1):
+            (total, operator) = layers[i][total]
+            operators.insert(0, operator)
+            if total is None:  # Multiplied by zero, so any operators can be used before it
+                return [all_operators[0]] * (i - 1) + operators
+
+        return operators
 
     def is_solvable(self, all_operators: [str]) -> bool:
-        return self.solve([], all_operators)
+        return self.solve_backwards(all_operators)
 
 
 class BridgeRepair:
@@ -60,15 +167,54 @@ class BridgeRepair:
     def get_answer_2(self) -> int:
         return self._get_answer(all_operators=Equation.OPERATORS_2)
 
-
-test_solution = BridgeRepair('test.txt')
-assert test_solution.get_answer_1() == 3749
-assert test_solution.get_answer_2() == 11387
-
-solution_1 = BridgeRepair('data.txt')
-answer_1 = solution_1.get_answer_1()
-print(f'Task 1 Answer: {answer_1}')
-
-solution_2 = BridgeRepair('data.txt')
-answer_2 = solution_2.get_answer_2()
-print(f'Task 2 Answer: {answer_2}')
\ No newline at end of file
+    def get_answers(self, processes: int|None = None, chunks_per_process: int = 4) -> (int, int):
+        '''
+        Calculates both answers in a single pass. Any equation solvable with the Part 1 operators is also solvable
+        with the Part 2 operators, so only the Part 1 failures are re-tested with concatenation.
+
+        :param processes: None (or 1) to test the equations in this process, otherwise the number of worker processes
+                          to spread the equations across (0 to use all cores)
+        :param chunks_per_process: The number of chunks of equations to create per worker process
+        :return: (answer 1, answer 2)
+        '''
+        if processes is None or processes == 1:
+            return _get_chunk_answers(self.equations)
+
+        processes = processes or os.cpu_count()
+        chunk_count = max(1, min(len(self.equations), processes * chunks_per_process))
+        chunks = [self.equations[i::chunk_count] for i in range(0, chunk_count)]
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_get_chunk_answers, chunks))
+
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _get_chunk_answers(equations: [Equation]) -> (int, int):
+    answer_1 = 0
+    answer_2 = 0
+    for equation in equations:
+        if equation.is_solvable(Equation.OPERATORS_1):
+            answer_1 += equation.answer
+            answer_2 += equation.answer
+        elif equation.is_solvable(Equation.OPERATORS_2):
+            answer_2 += equation.answer
+
+    return answer_1, answer_2
+
+
+if __name__ == '__main__':
+    # The guard is required so that worker processes (which re-import this module) don't re-run the solution.
+    test_solution = BridgeRepair('test.txt')
+    assert test_solution.get_answer_1() == 3749
+    assert test_solution.get_answer_2() == 11387
+    assert test_solution.get_answers() == (3749, 11387)
+    assert test_solution.get_answers(processes=2) == (3749, 11387)
+    assert Equation(7290, [6, 8, 6, 15]).solve_forwards(Equation.OPERATORS_2) == ['*', '||', '*']
+    assert Equation(7290, [6, 8, 6, 15]).solve_forwards(Equation.OPERATORS_1) is None
+    assert Equation(0, [100, 0]).solve_forwards(Equation.OPERATORS_1) == ['*']
+
+    solution = BridgeRepair('data.txt')
+    (answer_1, answer_2) = solution.get_answers(processes=0)
+    print(f'Task 1 Answer: {answer_1}')
+    print(f'Task 2 Answer: {answer_2}')
\ No newline at end of file
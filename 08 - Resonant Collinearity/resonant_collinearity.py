@@ -21,9 +21,63 @@ Design Notes:
 """
 
 import copy
+import math
+
+class AntinodeMap:
+    """
+    One flag per map location, shared by all the antenna meshes so that antinodes are de-duplicated as they are
+    written rather than by repeatedly converting lists to sets.
+    """
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self._cells = bytearray(width * height)
+
+    def add(self, x: int, y: int):
+        self._cells[y * self.width + x] = 1
+
+    @staticmethod
+    def _get_step_range(p: int, step: int, size: int) -> (int, int):
+        """
+        :return: The (inclusive) range of t for which 0 <= p + t*step < size
+        """
+        (low, high) = (-p, size - 1 - p) if step > 0 else (size - 1 - p, -p)
+        return -(-low // step), high // step
+
+    def add_line(self, x1: int, y1: int, x2: int, y2: int):
+        """
+        Adds every grid location exactly in line with (x1,y1) and (x2,y2). Reducing (dx, dy) by their gcd gives the
+        smallest step between grid locations on the line. The range of steps that remain on the map is calculated
+        directly, and, as the locations are evenly spaced in the flat cell array, they are set with a single slice
+        assignment.
+        """
+        assert (x1, y1) != (x2, y2)
+        (dx, dy) = (x2 - x1, y2 - y1)
+        g = math.gcd(dx, dy)
+        (sx, sy) = (dx // g, dy // g)
+        if sy < 0 or (sy == 0 and sx < 0):  # Step forwards through the cells
+            (sx, sy) = (-sx, -sy)
+
+        (t_min, t_max) = AntinodeMap._get_step_range(y1, sy, self.height) if sy else (-self.width, self.width)
+        if sx:
+            (tx_min, tx_max) = AntinodeMap._get_step_range(x1, sx, self.width)
+            (t_min, t_max) = (max(t_min, tx_min), min(t_max, tx_max))
+
+        n = t_max - t_min + 1
+        start = (y1 + t_min * sy) * self.width + x1 + t_min * sx
+        stride = sy * self.width + sx
+        self._cells[start:start + n * stride:stride] = b'\x01' * n
+
+    def __contains__(self, item) -> bool:
+        (x, y) = item
+        return bool(self._cells[y * self.width + x])
+
+    def __len__(self):
+        return self._cells.count(1)
+
+    def __iter__(self):
+        return ((i % self.width, i // self.width) for i, c in enumerate(self._cells) if c)
 
-def unique(l: list):
-    return list(set(l))
 
 class AntennaMesh:
     """
@@ -40,41 +94,19 @@ class AntennaMesh:
         self.locations.append((x,y))
 
     @staticmethod
-    def _find_harmonics(x1: int,
-                        y1: int,
-                        x2: int,
-                        y2: int,
-                        width: int,
-                        height: int,
-                        include_harmonics: bool=False):
-        antinodes = []
-        found_antinode = True
-
-        m = 1
-        while found_antinode:  # Keep looping while antinodes remain within the bounds of the map.
-            found_antinode = False
-
-            for direction in range(0, 2):  # 0, 1
-                if direction:
-                    (ax, ay) = (x1-m*(x2-x1), y1-m*(y2-y1))
-                else:
-                    (ax, ay) = (x2 + m*(x2-x1), y2 + m*(y2-y1))
-
-                if 0 <= ax < width and 0 <= ay < height:
-                    antinodes.append((ax, ay))
-                    found_antinode = True  # if at least one antinode is within the map, keep looking for harmonics...
-
-            if not include_harmonics: # If harmonics are not required (Part 1), simply skip the loop.
-                break
-
-            m += 1
-
-        return unique(antinodes)
+    def _find_antinode_pair(x1: int, y1: int, x2: int, y2: int, antinodes: AntinodeMap):
+        """
+        Adds the antinode beyond each end of the pair (where it is within the map), i.e. the Part 1 antinodes.
+        """
+        for (ax, ay) in [(x1 - (x2 - x1), y1 - (y2 - y1)), (x2 + (x2 - x1), y2 + (y2 - y1))]:
+            if 0 <= ax < antinodes.width and 0 <= ay < antinodes.height:
+                antinodes.add(ax, ay)
 
     def find_antinodes(self,
                        width: int,
                        height: int,
-                       include_harmonics: bool=False) -> [(int,int)]:
+                       include_harmonics: bool=False,
+                       antinodes: AntinodeMap|None=None) -> AntinodeMap:
         """
         Will list all the locations that antinodes are generated from pairs of antenna positions. Either one antinode
         at each end of the pair (assuming they are not too close to the edge of the map, or aninodes periodically if
@@ -83,28 +115,29 @@ class AntennaMesh:
         :param width: Width of the map
         :param height: Height of the map
         :param include_harmonics: If True will generate multiple antinodes (each end) vs. just one (per end)
-        :return: A list of (x,y) locations of the antinodes
+        :param antinodes: Optional map to add the antinodes to (e.g. shared by all meshes)
+        :return: The map of antinode locations
         """
 
-        antinodes = []
+        if antinodes is None:
+            antinodes = AntinodeMap(width, height)
+
         locations = copy.copy(self.locations)
         while locations:
             (x1, y1) = locations.pop()
-            if include_harmonics and len(locations) > 0:
-                antinodes.append((x1, y1))
 
             for (x2, y2) in locations:
-                antinodes.extend(AntennaMesh._find_harmonics(x1=x1,
-                                                             y1=y1,
-                                                             x2=x2,
-                                                             y2=y2,
-                                                             width=width,
-                                                             height=height,
-                                                             include_harmonics=include_harmonics))
                 if include_harmonics:
-                    antinodes.append((x2, y2))
+                    # Every location in line with the pair, including the antennas themselves
+                    antinodes.add_line(x1, y1, x2, y2)
+                else:
+                    AntennaMesh._find_antinode_pair(x1=x1,
+                                                    y1=y1,
+                                                    x2=x2,
+                                                    y2=y2,
+                                                    antinodes=antinodes)
 
-        return unique(antinodes)
+        return antinodes
 
     def __contains__(self, item):
         return item in self.locations
@@ -113,14 +146,22 @@ class AntennaMesh:
         return self.frequency + f' ({len(self.locations)})'
 
 class AntennaMeshList(list):
+    """
+    List of antenna meshes, indexed by frequency for constant time lookups.
+    """
+    def __init__(self):
+        super().__init__()
+        self._index = {}
+
+    def append(self, mesh: AntennaMesh):
+        super().append(mesh)
+        self._index[mesh.frequency] = mesh
+
     def __contains__(self, item) -> bool:
-        for a in self:
-            if a.frequency == item:
-                return True
-        return False
+        return item in self._index
 
     def get_antenna_mesh(self, frequency) -> AntennaMesh:
-        return next(am for am in self if am.frequency == frequency)
+        return self._index[frequency]
 
 
 class ResonantCollinearity:
@@ -136,14 +177,13 @@ class ResonantCollinearity:
     def _load_data(self, filename: str):
         with open(filename, 'r') as f:
             for y, row in enumerate(f):
-                map_row = ''
-                for x, c in enumerate(row.strip()):
+                map_row = row.strip()
+                for x, c in enumerate(map_row):
                     if c != ResonantCollinearity.default_symbol:
                         if not c in self.meshes:
                             self.meshes.append(AntennaMesh(c))
                         am = self.meshes.get_antenna_mesh(c)
                         am.add_location(x, y)
-                    map_row += c
                 self.map.append(map_row)
 
     @property
@@ -155,12 +195,10 @@ class ResonantCollinearity:
         return len(self.map)
 
     def _get_answer(self, include_harmonics=False):
-        antinodes = []
+        antinodes = AntinodeMap(self.width, self.height)
         mesh: AntennaMesh
         for mesh in self.meshes:
-            antinodes.extend(mesh.find_antinodes(self.width, self.height, include_harmonics=include_harmonics))
-
-        antinodes = unique(antinodes)
+            mesh.find_antinodes(self.width, self.height, include_harmonics=include_harmonics, antinodes=antinodes)
 
         if self._debug:
             s = self.as_string(antinodes)
@@ -175,16 +213,12 @@ class ResonantCollinearity:
     def get_answer_2(self) -> int:
         return self._get_answer(include_harmonics=True)
 
-    def as_string(self, antinodes: [(int, int)]):
-        s = ''
+    def as_string(self, antinodes: AntinodeMap):
+        rows = []
         for y in range(0, self.height):
-            for x in range(0, self.width):
-                if (x,y) in antinodes:
-                    s += ResonantCollinearity.antinode_symbol
-                else:
-                    s += self.map[y][x]
-            s += '\n'
-        return s
+            rows.append(''.join([ResonantCollinearity.antinode_symbol if (x,y) in antinodes else self.map[y][x]
+                                 for x in range(0, self.width)]))
+        return ''.join([row + '\n' for row in rows])
 
 test_solution = ResonantCollinearity('test.txt')
 assert test_solution.get_answer_1() == 14
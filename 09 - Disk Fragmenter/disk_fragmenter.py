@@ -20,187 +20,181 @@ Change the defragmentation to only move a file left if there is a space big enou
 
 '''
 
-class FileIdCounter:
-    def __init__(self):
-        self.id_counter = 0
+import heapq
+from array import array
+from typing import Iterator
 
-    def take_id(self):
-        self.id_counter += 1
-        return self.id_counter - 1
+def calculate_checksum(id: int, offset: int, length: int) -> int:
+    '''
+    :return: The checksum of a run of blocks of one file, i.e. the sum of id * p for p in offset..offset+length-1,
+             using the arithmetic series formula
+    '''
+    return id * (2 * offset + length - 1) * length // 2
 
 
-class DiskFile:
+class FileColumns:
     '''
-        A segment of a file, with a length and optionally some space. Each file segment contains the ID for the
-        file. This is either generated during load automatically (using the FileIdCounter) or inherited during
-        file segment moves.
+    The files stored as parallel arrays of id, length, space and offset (one entry per file), rather than one object
+    per file. This takes around 20 bytes per file, so very large disk maps can be held in memory, and the whole-file
+    compaction and checksum run directly over the arrays.
     '''
-
-    def __init__(self,
-                 length: int,
-                 space: int,
-                 id: int|None = None,
-                 id_counter: FileIdCounter | None = None):
-        self.length = length
-        self.space = space
-        if id is not None:
-            self.id = id
-        else:
-            self.id = id_counter.take_id()
+    def __init__(self):
+        self.ids = array('i')
+        self.lengths = array('i')
+        self.spaces = array('i')
+        self.offsets = array('q')
+        self._checksum: int|None = None  # Maintained by compact_whole_files() once calculated
+
+    @staticmethod
+    def from_disk_map(disk_map: str) -> 'FileColumns':
+        file_columns = FileColumns()
+        offset = 0
+        for i in range(0, len(disk_map), 2):
+            length = int(disk_map[i])
+            space = int(disk_map[i+1]) if i+1 < len(disk_map) else 0
+            file_columns.append(i // 2, length, space, offset)
+            offset += length + space
+        return file_columns
+
+    def append(self, id: int, length: int, space: int, offset: int):
+        self.ids.append(id)
+        self.lengths.append(length)
+        self.spaces.append(space)
+        self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _calculate_checksum(self) -> int:
+        return sum([calculate_checksum(id, offset, length)
+                    for (id, offset, length) in zip(self.ids, self.offsets, self.lengths)])
 
     @property
-    def total_size(self):
-        return self.length + self.space
-
-    def __str__(self):
-        return f'<{self.id}>[{self.length}][{self.space}]'
-
-
-class FileSegments(list):
-    def total_length(self):
-        return sum([b.length+b.space for b in self])
-
-    def inject_file_segment(self, position: int, from_file: DiskFile) -> int:
-        """
-        This will attempt to inject a block to accommodate the required length. If there is not enough space, it
-        will fill what it can, then return the number of remaining length that could not be filled.
-
-        :param position: The location of the file segment after which to inject some/all of the from_file
-        :param from_file: The file segment to move.
-        :return: the un-stored length
-        """
-
-        prior_file_segment: DiskFile = self[position]
-
-        available_space = prior_file_segment.space
-        remaining_length = 0 if available_space >= from_file.length else from_file.length - available_space
-        new_file_segment_length = from_file.length - remaining_length
-        prior_file_segment_remaining_space = available_space - new_file_segment_length
-
-        # Create a new segment, inheriting the ID of the from_file.
-        new_file_segment = DiskFile(length=new_file_segment_length,
-                                    space=prior_file_segment_remaining_space,
-                                    id=from_file.id)
-        self.insert(position+1, new_file_segment)
-
-        # Update the from_file to reflect what has been moved
-        from_file.space += from_file.length - remaining_length
-        from_file.length = remaining_length
-        prior_file_segment.space = 0
-
-        return remaining_length
-
-    def find_next_empty_file_segment_position(self,
-                                              last_full_file_segment_pos: int,
-                                              min_required_size: int):
-        for i in range(last_full_file_segment_pos, len(self)):
-            if self[i].space >= min_required_size:
-                return i
-
-        return -1
-
-    def find_next_file_segment_to_move_position(self, pos: int, first_empty_file_segment_pos: int) -> int:
-        while self[pos].length == 0:
-            pos -= 1
-            if pos <= first_empty_file_segment_pos:
-                return -1
-
-        return pos
-
-    def compact_blocks(self, force_full_files_only: bool = False):
-        low_i = 0
-        high_i = len(self)-1
-
-        while True:
-            next_file_segment_to_move_pos = self.find_next_file_segment_to_move_position(high_i, low_i)
-            if next_file_segment_to_move_pos == -1:
-                break
-
-            from_file_segment = self[next_file_segment_to_move_pos]
-
-            min_required_size = 1 if not force_full_files_only else from_file_segment.length
-
-            next_empty_file_segment = self.find_next_empty_file_segment_position(last_full_file_segment_pos=low_i,
-                                                                                 min_required_size=min_required_size)
+    def checksum(self):
+        return self._checksum if self._checksum is not None else self._calculate_checksum()
 
+    def as_string(self):
+        blocks = ['.'] * (sum(self.lengths) + sum(self.spaces))
+        for (id, offset, length) in zip(self.ids, self.offsets, self.lengths):
+            blocks[offset:offset + length] = [str(id)] * length
+
+        return ''.join(blocks)
+
+    def _build_gap_index(self) -> {int: [int]}:
+        '''
+        :return: A dictionary of gap size -> min-heap of the offsets of the gaps of that size
+        '''
+        gaps = {}
+        for (offset, length, space) in zip(self.offsets, self.lengths, self.spaces):
+            if space > 0:
+                gaps.setdefault(space, []).append(offset + length)
+
+        for offsets in gaps.values():
+            heapq.heapify(offsets)
+
+        return gaps
+
+    def compact_whole_files(self):
+        '''
+        Moves each whole file (from the right) to the left-most gap that can hold it. The gaps are indexed by size, so
+        finding the left-most gap that fits is a check of the first offset in each heap of a large enough size. Files
+        are moved by changing their offset, so the layout is defined by the offsets (the spaces are no longer
+        meaningful once compacted). Any space freed by a move is to the right of all the files still to be moved, so
+        it is never added to the index.
+        '''
+        self._checksum = self._calculate_checksum()
+        gaps = self._build_gap_index()
+        max_gap_size = max(gaps.keys(), default=0)
+
+        for i in range(len(self) - 1, -1, -1):
+            length = self.lengths[i]
+            if length == 0:
+                continue
+
+            best_offset, best_size = self.offsets[i], None
+            for size in range(length, max_gap_size + 1):
+                offsets = gaps.get(size)
+                if offsets and offsets[0] < best_offset:
+                    best_offset, best_size = offsets[0], size
+
+            if best_size is None:
+                continue
+
+            heapq.heappop(gaps[best_size])
+            remaining_size = best_size - length
+            if remaining_size > 0:
+                heapq.heappush(gaps.setdefault(remaining_size, []), best_offset + length)
 
-            if next_empty_file_segment == -1 or next_empty_file_segment >= next_file_segment_to_move_pos:
-                if force_full_files_only:
-                    high_i = next_file_segment_to_move_pos-1 # move to the next block
-                    if high_i > low_i:
-                        continue        # Skip the block and move on
-                    else:
-                        break           # Run out of blocks to move, quit
-                else:
-                    break
+            self._checksum += self.ids[i] * length * (best_offset - self.offsets[i])
+            self.offsets[i] = best_offset
 
-            from_total_size = from_file_segment.total_size
-            remaining_size = self.inject_file_segment(next_empty_file_segment, from_file_segment)
-            if remaining_size > 0:
-                high_i += 1  # a block was injected, so we have to move right
-            else:
-                self[high_i].space += from_total_size
-                self.pop(high_i+1)  # Remove the moved block
 
-            while self[low_i].space ==0:
-                low_i += 1
+def compact_disk_map(disk_map: str) -> Iterator[tuple[int, int, int]]:
+    '''
+    Compacts the blocks (Part 1) directly from the disk map, without creating any file segments. One pointer moves
+    from the left over the files and the gaps after them, and the other from the right over the files used to fill
+    those gaps.
 
-        # if len(self) < 100:
-        #     s = self.as_string()
-        #     pass
+    :param disk_map: The dense disk map, e.g. '12345'
+    :return: A stream of (id, offset, length) runs of blocks, in disk order
+    '''
+    left_id = 0
+    right_id = (len(disk_map) - 1) // 2
+    right_remaining = int(disk_map[2 * right_id])
+    offset = 0
 
-    def as_string(self):
-        s = ''
-        for file_segment in self:
-            if file_segment.length > 0:
-                s += str(file_segment.id)*file_segment.length + '.'*file_segment.space
+    while left_id < right_id:
+        length = int(disk_map[2 * left_id])
+        if length:
+            yield left_id, offset, length
+            offset += length
 
-        return s
+        gap = int(disk_map[2 * left_id + 1])
+        while gap > 0 and left_id < right_id:
+            moved = min(gap, right_remaining)
+            if moved:
+                yield right_id, offset, moved
+                offset += moved
+                gap -= moved
+                right_remaining -= moved
 
-    @property
-    def checksum(self):
-        p = 0
-        checksum = 0
-        for file_segment in self:
-            for i in range(0, file_segment.length):
-                checksum += p*file_segment.id
-                p += 1
+            if right_remaining == 0:
+                right_id -= 1
+                right_remaining = int(disk_map[2 * right_id])
 
-            for i in range(0, file_segment.space):
-                p += 1
+        left_id += 1
 
-        return checksum
+    if left_id == right_id and right_remaining:
+        yield right_id, offset, right_remaining
 
 
 class DiskFragmenter:
     def __init__(self, filename: str):
-        self.file_segments: FileSegments = FileSegments()
-        self.id_counter = FileIdCounter()
+        self.disk_map = ''
 
         self._load_data(filename)
+        self.file_columns = FileColumns.from_disk_map(self.disk_map)
 
     def _load_data(self, filename: str):
         with open(filename, 'r') as f:
             for row in f:
-                row = row.strip() + '0'
-                self.file_segments.extend([DiskFile(int(row[i]),
-                                                    int(row[i+1]),
-                                                    id=None,
-                                                    id_counter=self.id_counter) for i in range(0, len(row), 2)])
+                self.disk_map += row.strip()
 
     def get_answer_1(self) -> int:
-        self.file_segments.compact_blocks()
-        return self.file_segments.checksum
+        return sum(calculate_checksum(id, offset, length)
+                   for (id, offset, length) in compact_disk_map(self.disk_map))
 
     def get_answer_2(self) -> int:
-        self.file_segments.compact_blocks(force_full_files_only=True)
-        return self.file_segments.checksum
+        self.file_columns.compact_whole_files()
+        return self.file_columns.checksum
 
 
 test_solution = DiskFragmenter('test.txt')
 assert test_solution.get_answer_1() == 1928
+assert ''.join(str(id) * length for (id, _, length) in compact_disk_map('12345')) == '022111222'
 test2_solution = DiskFragmenter('test.txt')
 assert test2_solution.get_answer_2() == 2858
+assert test2_solution.file_columns.as_string() == '00992111777.44.333....5555.6666.....8888..'
 
 solution_1 = DiskFragmenter('data.txt')
 answer_1 = solution_1.get_answer_1()
@@ -20,62 +20,116 @@ X654X874
 
 '''
 
+import numpy as np
+
 from map import MapBase, Map
 
 class HoofIt(Map):
     dx_dy = [(0,1), (0,-1), (1,0), (-1,0)]
+
+    # A peak is at most 9 steps from any cell that can reach it, so the reachable peaks fit in a 19x19 window centred
+    # on the cell. Bit (dx + 9) + 19 * (dy + 9) of a cell's mask is the peak at offset (dx, dy).
+    PEAK_WINDOW = 19
+    PEAK_WINDOW_CENTRE = 9 + 19 * 9
     def __init__(self, filename: str):
         super().__init__(filename)
-
-    def find_trail_starts(self):
-        return [(x,y) for y in range(self.height) for x in range(self.width) if self.map[y][x] == '0']
-
-    def count_trail_heads_from_start_position(self,
-                                              trail_start: (int,int),
-                                              count_all_paths: bool = False) -> int:
-        found_peaks = []
-        flood_positions = [trail_start]
-
-        while flood_positions:
-            (x0, y0) = flood_positions.pop(0)
-            h0 = self.map[y0][x0]
-            for (dx, dy) in HoofIt.dx_dy:
-                (x1, y1) = (x0 + dx, y0 + dy)
-                if not (0 <= x1 < self.width and 0 <= y1 < self.height):
-                    continue
-
-                h1 = self.map[y1][x1]
-                if h0 == '8' and h1 == '9':
-                    if count_all_paths or (x1, y1) not in found_peaks:
-                        found_peaks.append((x1, y1))
-                else:
-                    if int(h1) - int(h0) == 1:
-                        flood_positions.append((x1, y1))
-        return len(found_peaks)
+        self._trail_head_scores: {(int,int): (int,int)}|None = None
+
+    def get_trail_head_scores(self) -> {(int,int): (int,int)}:
+        '''
+        Scores every trail head in a single sweep down the heights, from 9 to 0. Each cell holds the number of distinct
+        trails from it to a peak, and the set of peaks it can reach (as a bit mask over the window of cells around it,
+        so the masks stay small however many peaks the map has). A cell's values are the sum (or union, shifted by the
+        neighbour's offset) of the values of its neighbours one level higher, so every cell is visited once
+        rather than once per trail head that can reach it.
+
+        :return: A dictionary of trail head (x,y) -> (number of reachable peaks, number of distinct trails)
+        '''
+        if self._trail_head_scores is not None:
+            return self._trail_head_scores
+
+        (width, height) = (self.width, self.height)
+        heights = [int(c) if c.isdigit() else -1 for row in self.map for c in row]
+        cells_by_height = [[] for _ in range(0, 10)]
+        for i, h in enumerate(heights):
+            if h >= 0:
+                cells_by_height[h].append(i)
+
+        trails = [0] * len(heights)
+        peaks = [0] * len(heights)
+        for i in cells_by_height[9]:
+            trails[i] = 1
+            peaks[i] = 1 << HoofIt.PEAK_WINDOW_CENTRE
+
+        for h in range(8, -1, -1):
+            for i in cells_by_height[h]:
+                (x, y) = (i % width, i // width)
+                for (dx, dy) in HoofIt.dx_dy:
+                    if 0 <= x + dx < width and 0 <= y + dy < height:
+                        j = i + dy * width + dx
+                        if heights[j] == h + 1:
+                            trails[i] += trails[j]
+                            shift = dx + dy * HoofIt.PEAK_WINDOW
+                            peaks[i] |= peaks[j] << shift if shift > 0 else peaks[j] >> -shift
+
+        self._trail_head_scores = {(i % width, i // width): (peaks[i].bit_count(), trails[i])
+                                   for i in cells_by_height[0]}
+        return self._trail_head_scores
 
     def get_answer_1(self) -> int:
-        trail_starts = self.find_trail_starts()
+        return sum(peak_count for (peak_count, _) in self.get_trail_head_scores().values())
 
-        total_count = 0
-        for trail_start in trail_starts:
-            total_count += self.count_trail_heads_from_start_position(trail_start)
+    def get_answer_2(self) -> int:
+        return sum(trail_count for (_, trail_count) in self.get_trail_head_scores().values())
 
-        return total_count
 
-    def get_answer_2(self) -> int:
-        trail_starts = self.find_trail_starts()
+class HoofItNumPy(HoofIt):
+    '''
+    Alternative engine for very large maps. The heights are held in a uint8 array (255 for anything that isn't a
+    height), and the trail counts for each height level are calculated for every cell at once by adding the counts of
+    the level above, shifted one cell in each direction. Only cells of the level above have non-zero counts, so the sum
+    only includes neighbours exactly one higher.
 
-        total_count = 0
-        for trail_start in trail_starts:
-            total_count += self.count_trail_heads_from_start_position(trail_start, count_all_paths=True)
+    Only the ratings (Part 2) are vectorised. The scores (Part 1) need a set of reachable peaks per cell, which can't be
+    held in a fixed width array, so they come from the layered sweep in HoofIt.
+    '''
+    NOT_A_HEIGHT = 255
 
-        return total_count
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        rows = [[int(c) if c.isdigit() else HoofItNumPy.NOT_A_HEIGHT for c in row] for row in self.map]
+        self.heights = np.array(rows, dtype=np.uint8)
+
+    @staticmethod
+    def _sum_neighbours(values: np.ndarray) -> np.ndarray:
+        result = np.zeros_like(values)
+        result[:-1, :] += values[1:, :]
+        result[1:, :] += values[:-1, :]
+        result[:, :-1] += values[:, 1:]
+        result[:, 1:] += values[:, :-1]
+        return result
+
+    def get_trail_ratings(self) -> np.ndarray:
+        '''
+        :return: An array of the number of distinct trails from each trail head (zero for all other cells)
+        '''
+        trails = (self.heights == 9).astype(np.int64)
+        for h in range(8, -1, -1):
+            trails = np.where(self.heights == h, HoofItNumPy._sum_neighbours(trails), 0)
+        return trails
+
+    def get_answer_2(self) -> int:
+        return int(self.get_trail_ratings().sum())
 
 
 test_solution = HoofIt('test.txt')
 assert test_solution.get_answer_1() == 36
 assert test_solution.get_answer_2() == 81
 
+test_solution_numpy = HoofItNumPy('test.txt')
+assert test_solution_numpy.get_answer_1() == 36
+assert test_solution_numpy.get_answer_2() == 81
+
 solution_1 = HoofIt('data.txt')
 answer_1 = solution_1.get_answer_1()
 print(f'Task 1 Answer: {answer_1}')
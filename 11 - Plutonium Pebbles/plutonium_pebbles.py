@@ -11,67 +11,254 @@ Part 2
 '''
 
 import copy
+import os
+import pickle
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from typing import Optional
 
-class Pebble:
-    pebbles = {}
-    iteration_level = -1
-    depth = 0
+import numpy as np
 
-    def __init__(self, pebble_number: str):
-        self.pebble_number = pebble_number
-        self.children = []
-        self._count_cache = {}
+POWERS_OF_TEN = [10 ** i for i in range(0, 64)]
 
-    def _as_string(self):
-        s = '[' + ', '.join([f"'{x.pebble_number}'" for x in self.children]) + ']'
-        return s
+def blink_stone(stone: int) -> (int,):
+    '''
+    Applies the rules to a single stone, using integer arithmetic rather than converting to and from strings.
+
+    :param stone: The number on the stone
+    :return: The stone(s) it becomes after one blink
+    '''
+    if stone == 0:
+        return (1,)
+
+    digits = bisect_right(POWERS_OF_TEN, stone)
+    assert digits < len(POWERS_OF_TEN)
+    if digits % 2 == 0:
+        return divmod(stone, POWERS_OF_TEN[digits // 2])
+
+    return (stone * 2024,)
+
+
+class BlinkCache:
+    '''
+    LRU cache of (stone, remaining blinks) -> number of stones. The cache is passed explicitly to the blink engine, so
+    it can be shared between runs, limited in size, reset, and optionally saved to disk so later runs start warm.
+
+    The cache should hold the working set of a count (roughly the distinct stones per blink times the number of
+    blinks, e.g. a few thousand entries for 75 blinks of the example). If it is much smaller, entries are evicted just
+    before they are reused and counting approaches brute force, so count_stones() falls back to the Counter sweep
+    once the whole cache has been evicted during a single count.
+    '''
+    def __init__(self, max_size: int = 1_000_000, filename: str|None = None):
+        assert max_size > 0
+        self.max_size = max_size
+        self.filename = filename
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
 
     def __str__(self):
-        return self._as_string()
+        return f'BlinkCache(size={len(self)}/{self.max_size}, hit rate={self.hit_rate:.1%})'
 
-    def _add_child(self, pebble_number: str):
-        if pebble_number in Pebble.pebbles:
-            self.children.append(Pebble.pebbles[pebble_number])
-        else:
-            new_pebble = Pebble(pebble_number=pebble_number)
-            self.pebbles[pebble_number] = new_pebble
-            self.children.append(new_pebble)
-            pass
-
-    def get_count(self, iterations: int, depth=1):
-        if depth > Pebble.depth:
-            Pebble.depth = depth
-            print(f'Depth: {depth}', end='\r')
-
-        if len(self.children) == 0:
-            self.populate_children()
-
-        if iterations == 0:
-            return 1
-        elif iterations == 1:
-            return len(self.children)
-        elif iterations in self._count_cache:
-            return self._count_cache[iterations]
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, stone: int, blinks: int) -> Optional[int]:
+        count = self._entries.get((stone, blinks))
+        if count is None:
+            self.misses += 1
         else:
-            total = 0
-            child: Pebble
-            for child in self.children:
-                total += child.get_count(iterations-1, depth+1)
-            self._count_cache[iterations] = total
-            return total
-
-    def populate_children(self):
-        if self.pebble_number == '0':
-            new_pebbles = ['1']
-        elif len(self.pebble_number) % 2 == 0:
-            pebble_1 = str(int(self.pebble_number[0:len(self.pebble_number) // 2]))
-            pebble_2 = str(int(self.pebble_number[len(self.pebble_number) // 2:]))
-            new_pebbles = [pebble_1, pebble_2]
+            self.hits += 1
+            self._entries.move_to_end((stone, blinks))
+        return count
+
+    def put(self, stone: int, blinks: int, count: int):
+        self._entries[(stone, blinks)] = count
+        self._entries.move_to_end((stone, blinks))
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def reset(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def save(self):
+        assert self.filename is not None
+        with open(self.filename, 'wb') as f:
+            pickle.dump(list(self._entries.items()), f)
+
+    def load(self):
+        assert self.filename is not None
+        with open(self.filename, 'rb') as f:
+            for (key, count) in pickle.load(f):
+                self.put(*key, count)
+
+
+def count_stones(stone: int, num_blinks: int, cache: BlinkCache) -> int:
+    '''
+    Counts the stones a single stone becomes after a number of blinks, depth first with an explicit stack (so there is
+    no recursion limit). Each stack frame holds the children still to be counted and the running total, so a child's
+    count is added to its parent as soon as it is known and never needs to be read back from the cache (which may
+    have evicted it). If the cache is too small for the count (see BlinkCache), the stones are counted with the Counter
+    sweep instead.
+    '''
+    if num_blinks == 0:
+        return 1
+
+    count = cache.get(stone, num_blinks)
+    if count is not None:
+        return count
+
+    evictions_at_start = cache.evictions
+    stack = [(stone, num_blinks, list(blink_stone(stone)), [0])]
+    while True:
+        (parent, blinks, children, total) = stack[-1]
+        if children:
+            child = children.pop()
+            if blinks == 1:
+                total[0] += 1
+                continue
+
+            count = cache.get(child, blinks - 1)
+            if count is not None:
+                total[0] += count
+            else:
+                if cache.evictions - evictions_at_start > cache.max_size:  # The cache is thrashing
+                    return PebbleEvolution([stone]).count_after_blinks(num_blinks)
+                stack.append((child, blinks - 1, list(blink_stone(child)), [0]))
         else:
-            new_pebbles = [str(int(self.pebble_number) * 2024)]
+            stack.pop()
+            cache.put(parent, blinks, total[0])
+            if not stack:
+                return total[0]
+            stack[-1][3][0] += total[0]
+
+
+class PebbleEvolution:
+    '''
+    Evolves the stones one blink at a time as a count of each distinct stone. The order of the stones never matters,
+    so all stones with the same number are processed once per blink, and memory depends on the number of distinct
+    stones rather than the total. Alternatively, if a BlinkCache is provided, the number of stones after any number of
+    blinks can be counted from the cache without evolving the stones.
+    '''
+    def __init__(self, stones: [int], cache: BlinkCache|None = None):
+        self.stones: Counter = Counter(stones)
+        self.blinks = 0
+        self.cache = cache
+
+    def blink(self, num_blinks: int = 1):
+        for _ in range(0, num_blinks):
+            stones = Counter()
+            for stone, count in self.stones.items():
+                for new_stone in blink_stone(stone):
+                    stones[new_stone] += count
+            self.stones = stones
+            self.blinks += 1
+
+    def num_pebbles(self) -> int:
+        return sum(self.stones.values())
+
+    def count_after_blinks(self, num_blinks: int) -> int:
+        '''
+        :return: The number of stones there will be after a further num_blinks, without changing the current stones
+        '''
+        if self.cache is not None:
+            return sum(count * count_stones(stone, num_blinks, self.cache) for stone, count in self.stones.items())
+
+        evolution = PebbleEvolution(self.stones)
+        evolution.blink(num_blinks)
+        return evolution.num_pebbles()
+
+    def __str__(self):
+        return f'{len(self.stones)} distinct of {self.num_pebbles()} after {self.blinks} blinks'
+
+
+class PebbleTransitionMatrix:
+    '''
+    Alternative engine for long horizons (e.g. 10^4 - 10^6 blinks). Every stone only ever becomes stones from a
+    closed set of a few thousand numbers, so the set is discovered once and a blink becomes a sparse transition matrix:
+    each stone becomes at most two others, so the matrix is held as two index arrays, first and second (with stones
+    that don't split pointing their second child at an extra entry that is always 0).
+
+    counts[i] is the number of stones that stone i becomes after the blinks so far. Each blink is then a single
+    vectorised gather, counts[first] + counts[second], with no rules applied and no stones hashed, and the total is
+    start · counts. The cost is still linear in the number of blinks (but of a few numpy operations per blink, rather
+    than a Counter sweep), and the counts are kept so that a later query for more blinks continues from them.
+
+    With a modulus (e.g. a prime such as 1_000_000_007) the counts are int64 and the totals are returned modulo the
+    modulus. Without one the counts are exact Python ints (in an object array), which grow with the number of blinks.
+    '''
+    MAX_MODULUS = 2 ** 62  # So that the sum of two counts can't overflow an int64
+
+    def __init__(self, stones: [int], modulus: int|None = None):
+        assert modulus is None or 1 < modulus < PebbleTransitionMatrix.MAX_MODULUS
+        self.modulus = modulus
+        self.stones = PebbleTransitionMatrix._find_closed_stones(stones)
+        self.index = {stone: i for i, stone in enumerate(self.stones)}
+
+        size = len(self.stones)
+        transitions = [tuple(self.index[s] for s in blink_stone(stone)) for stone in self.stones]
+        self.first = np.array([children[0] for children in transitions], dtype=np.int64)
+        self.second = np.array([children[1] if len(children) > 1 else size for children in transitions],
+                               dtype=np.int64)
+
+        self.start = [0] * size
+        for stone, count in Counter(stones).items():
+            self.start[self.index[stone]] += count
+
+        self._dtype = object if modulus is None else np.int64
+        self._reset_counts()
+
+    @staticmethod
+    def _find_closed_stones(stones: [int]) -> [int]:
+        found = dict.fromkeys(stones)
+        queue = list(found)
+        while queue:
+            for new_stone in blink_stone(queue.pop()):
+                if new_stone not in found:
+                    found[new_stone] = None
+                    queue.append(new_stone)
+        return list(found)
+
+    def __len__(self):
+        return len(self.stones)
+
+    def _reset_counts(self):
+        self._blinks = 0
+        self._counts = np.ones(len(self.stones) + 1, dtype=self._dtype)
+        self._counts[-1] = 0
+
+    def _blink(self):
+        counts = self._counts[self.first] + self._counts[self.second]
+        if self.modulus is not None:
+            counts %= self.modulus
+        self._counts = np.append(counts, np.zeros(1, dtype=self._dtype))
+        self._blinks += 1
+
+    def count_after_blinks(self, num_blinks: int) -> int:
+        '''
+        :return: The number of stones after num_blinks (modulo the modulus, if there is one)
+        '''
+        if num_blinks < self._blinks:
+            self._reset_counts()
+        while self._blinks < num_blinks:
+            self._blink()
+
+        total = sum(count * int(self._counts[i]) for i, count in enumerate(self.start) if count)
+        return total if self.modulus is None else total % self.modulus
 
-        for new_pebble in new_pebbles:
-            self._add_child(new_pebble)
 
 # class Pebbles:
 #     def __init__(self, pebbles: [str]):
@@ -89,8 +276,9 @@ class Pebble:
 #         return str(self.pebbles_dict) + f' ({self.num_pebbles()})'
 
 class PlutoniumPebbles:
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, cache: BlinkCache|None = None):
         self.pebbles = []
+        self.cache = cache
         self._load_data(filename)
 
     def _load_data(self, filename: str):
@@ -138,15 +326,9 @@ class PlutoniumPebbles:
         #     pebble = pebbles[i]
 
 
-    def get_answer_1(self, num_blinks: int) -> int:
-        pebbles = []
-        total = 0
-        for p in self.pebbles:
-            pebble = Pebble(p)
-            total += pebble.get_count(num_blinks)
-
-
-        return total
+    def get_answer_1(self, num_blinks: int = 25) -> int:
+        evolution = PebbleEvolution([int(p) for p in self.pebbles], cache=self.cache)
+        return evolution.count_after_blinks(num_blinks)
 
         # total = 0
         # for
@@ -158,8 +340,16 @@ class PlutoniumPebbles:
         # answer = sum([x for x in pebbles.pebbles_dict.values()])
         # return answer
 
-    def get_answer_2(self) -> int:
-        pass
+    def get_answer_2(self, num_blinks: int = 75) -> int:
+        return self.get_answer_1(num_blinks)
+
+    def get_long_answer(self, num_blinks: int, modulus: int|None = None) -> int:
+        '''
+        :return: The number of stones after num_blinks (modulo the modulus, if there is one), using the transition
+                 matrix, for horizons too long for the Counter sweep
+        '''
+        matrix = PebbleTransitionMatrix([int(p) for p in self.pebbles], modulus=modulus)
+        return matrix.count_after_blinks(num_blinks)
 
 
 #test_solution = PlutoniumPebbles('test.txt')
@@ -169,10 +359,23 @@ test2_solution = PlutoniumPebbles('test2.txt')
 assert test2_solution.get_answer_1(6) == 22
 assert test2_solution.get_answer_1(25) == 55312 # update
 
-solution_1 = PlutoniumPebbles('data.txt')
+blink_cache = BlinkCache(max_size=100_000)
+assert PlutoniumPebbles('test2.txt', cache=blink_cache).get_answer_1(25) == 55312
+assert count_stones(125, 40, BlinkCache(max_size=100)) == PebbleEvolution([125]).count_after_blinks(40)
+assert test2_solution.get_long_answer(25) == 55312
+assert test2_solution.get_long_answer(75, modulus=1_000_000_007) == test2_solution.get_answer_2() % 1_000_000_007
+
+realistic_stones = [0, 7, 6618216, 26481, 885, 42, 202642, 8791]
+realistic_matrix = PebbleTransitionMatrix(realistic_stones, modulus=1_000_000_007)
+assert len(realistic_matrix) > 3000
+realistic_answer = PebbleEvolution(realistic_stones).count_after_blinks(150)
+assert realistic_matrix.count_after_blinks(150) == realistic_answer % 1_000_000_007
+assert PebbleTransitionMatrix(realistic_stones).count_after_blinks(150) == realistic_answer
+
+solution_1 = PlutoniumPebbles('data.txt', cache=blink_cache)
 answer_1 = solution_1.get_answer_1(25)
 print(f'Task 1 Answer: {answer_1}')
 
-solution_2 = PlutoniumPebbles('data.txt')
-answer_2 = solution_2.get_answer_1(75)
+solution_2 = PlutoniumPebbles('data.txt', cache=blink_cache)
+answer_2 = solution_2.get_answer_2()
 print(f'Task 2 Answer: {answer_2}')
\ No newline at end of file
@@ -11,32 +11,56 @@ Part 2
 '''
 from selectors import SelectSelector
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 directions = ['N', 'E', 'S', 'W']
 dx_dy_list = [(0, -1), (1, 0), (0, 1), (-1, 0)]
 start_from = ['W', 'N', 'E', 'S']
 
 
 class Region:
-    def __init__(self, crop: str, points: [(int,int)]):
+    def __init__(self,
+                 crop: str,
+                 points: [(int,int)],
+                 perimeter: int|None = None,
+                 sides: int|None = None):
+        '''
+        :param crop: The crop grown in the region
+        :param points: The (x,y) positions of the region in the garden
+        :param perimeter: The perimeter, if already known (e.g. from RegionLabels), otherwise it is calculated
+        :param sides: The number of sides, if already known, otherwise calculate_sides() calculates it
+        '''
         self.points = points
-        self.map = []
         self.crop = crop
         self.area = len(points)
+        self._map = None
+        self._sides = sides
+        self.perimeter = self.calculate_perimeter() if perimeter is None else perimeter
 
-        (x_min, x_max, y_min, y_max) = Region._boundary(points)
+    @property
+    def map(self) -> [str]:
+        '''
+        A private map of just this region, only built when needed (i.e. when the perimeter or sides weren't provided)
+        '''
+        if self._map is None:
+            self._map = []
+            (x_min, x_max, y_min, y_max) = Region._boundary(self.points)
 
-        width = x_max - x_min
-        height = y_max - y_min
+            width = x_max - x_min
+            height = y_max - y_min
 
-        for y in range(0, height+1):
-            self.map.append('.'*(width+1))
+            for y in range(0, height+1):
+                self._map.append('.'*(width+1))
 
-        for point in points:
-            (x,y) = point
-            row = self.map[y-y_min]
-            self.map[y-y_min] = row[:x-x_min] + self.crop + row[x-x_min+1:]
+            for point in self.points:
+                (x,y) = point
+                row = self._map[y-y_min]
+                self._map[y-y_min] = row[:x-x_min] + self.crop + row[x-x_min+1:]
 
-        self.perimeter = self.calculate_perimeter()
+        return self._map
 
     def get_crop(self, point: (int, int)):
         (x, y) = point
@@ -135,6 +159,9 @@ class Region:
         return total_sides
 
     def calculate_sides(self):
+        if self._sides is not None:
+            return self._sides
+
         total_sides = 0
         total_sides += self._calculate_sides('S')
         total_sides += self._calculate_sides('N')
@@ -173,16 +200,191 @@ class Region:
         return self.crop
 
 class Regions(list):
+    '''
+    List of regions, with a set of all their points for constant time lookups.
+    '''
+    def __init__(self):
+        super().__init__()
+        self._points = set()
+
+    def append(self, region: Region):
+        super().append(region)
+        self._points.update(region.points)
+
     def is_in_region(self, point: (int, int)) -> bool:
-        for region in self:
-            if point in region.points:
-                return True
+        return point in self._points
+
+
+class RegionLabels:
+    '''
+    Labels every cell of the garden with the region it belongs to, in a single pass over the map. Each cell is
+    compared with the cell to its left and the cell above, so only the labels of the current and previous rows are
+    needed. A cell with no matching neighbour starts a new provisional label, and where the left and above labels
+    differ (e.g. the two arms of a U shape meeting) they are merged with union-find. The provisional labels are then
+    resolved to one label per region, numbered in the order the regions are first found (top to bottom, left to
+    right), giving O(cells · α(cells)) rather than a search of every region for every cell.
+
+    The perimeters and sides of every region are then counted in one sweep of 2x2 windows over the labels (see
+    _count_boundaries), so no region needs a map of its own.
+    '''
+    def __init__(self, garden_map: [str]):
+        self.width = len(garden_map[0]) if garden_map else 0
+        self.height = len(garden_map)
+        self.labels = [0] * (self.width * self.height)
+        self.crops = []
+        self.areas = []
+        self.perimeters = []
+        self.sides = []
+        self.cells = []
+        self._label(garden_map)
+        if np is not None:
+            self._count_boundaries_numpy()
+        else:
+            self._count_boundaries()
 
-        return False
+    @staticmethod
+    def _find(parents: [int], label: int) -> int:
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]  # Path halving
+            label = parents[label]
+        return label
+
+    def _label(self, garden_map: [str]):
+        width = self.width
+        parents = []
+        areas = []
+        previous_labels = []
+        previous_row = ''
+        for y, row in enumerate(garden_map):
+            current_labels = [0] * width
+            for x, crop in enumerate(row):
+                left = current_labels[x - 1] if x and row[x - 1] == crop else None
+                above = previous_labels[x] if y and previous_row[x] == crop else None
+
+                if left is None and above is None:
+                    label = len(parents)
+                    parents.append(label)
+                    areas.append(0)
+                else:
+                    label = above if left is None else left
+                    if left is not None and above is not None and left != above:
+                        (root_left, root_above) = (RegionLabels._find(parents, left),
+                                                   RegionLabels._find(parents, above))
+                        if root_left != root_above:
+                            parents[max(root_left, root_above)] = min(root_left, root_above)
+
+                current_labels[x] = label
+                areas[label] += 1
+
+            self.labels[y * width:(y + 1) * width] = current_labels
+            (previous_labels, previous_row) = (current_labels, row)
+
+        # Resolve the provisional labels. The root of each set is its smallest label, which was created by the
+        # region's first cell, so numbering the roots in order numbers the regions in the order they are found.
+        final_labels = [0] * len(parents)
+        for label in range(0, len(parents)):
+            root = RegionLabels._find(parents, label)
+            if root == label:
+                final_labels[label] = len(self.crops)
+                self.crops.append(None)
+                self.areas.append(0)
+                self.cells.append([])
+            else:
+                final_labels[label] = final_labels[root]
+            self.areas[final_labels[label]] += areas[label]
+
+        for i, label in enumerate(self.labels):
+            region = final_labels[label]
+            self.labels[i] = region
+            self.cells[region].append((i % width, i // width))
+
+        for region, cells in enumerate(self.cells):
+            (x, y) = cells[0]
+            self.crops[region] = garden_map[y][x]
+
+    # (owner, horizontal neighbour, vertical neighbour, diagonal neighbour) positions within a 2x2 window, where the
+    # positions are 0 (top left), 1 (top right), 2 (bottom left) and 3 (bottom right)
+    WINDOW_CORNERS = [(0, 1, 2, 3), (1, 0, 3, 2), (2, 3, 0, 1), (3, 2, 1, 0)]
+
+    def _get_padded_labels(self) -> [[int]]:
+        '''
+        :return: The labels as rows, surrounded by a border of -1 so that the edge of the map is a boundary
+        '''
+        border = [-1] * (self.width + 2)
+        rows = [[-1] + self.labels[y * self.width:(y + 1) * self.width] + [-1] for y in range(0, self.height)]
+        return [border] + rows + [border]
+
+    def _count_boundaries(self):
+        '''
+        Counts the perimeter and sides of every region in one sweep of the 2x2 windows of the (padded) labels. Each
+        pair of differing neighbours in a window's top row or left column is one unit of perimeter for each of them.
+        The number of sides of a region is the same as its number of corners, and each cell of a window has a corner
+        at the window's centre if it differs from both its horizontal and vertical neighbours (convex), or matches
+        both but differs from its diagonal neighbour (concave).
+        '''
+        self.perimeters = [0] * len(self)
+        self.sides = [0] * len(self)
+        rows = self._get_padded_labels()
+        for y in range(0, self.height + 1):
+            (top, bottom) = (rows[y], rows[y + 1])
+            for x in range(0, self.width + 1):
+                window = (top[x], top[x + 1], bottom[x], bottom[x + 1])
+                if window[0] != window[1]:
+                    for label in window[0:2]:
+                        if label >= 0:
+                            self.perimeters[label] += 1
+                if window[0] != window[2]:
+                    for label in (window[0], window[2]):
+                        if label >= 0:
+                            self.perimeters[label] += 1
+
+                for (owner, horizontal, vertical, diagonal) in RegionLabels.WINDOW_CORNERS:
+                    label = window[owner]
+                    if label < 0:
+                        continue
+                    if label != window[horizontal] and label != window[vertical]:
+                        self.sides[label] += 1
+                    elif label == window[horizontal] and label == window[vertical] and label != window[diagonal]:
+                        self.sides[label] += 1
+
+    def _count_boundaries_numpy(self):
+        '''
+        As _count_boundaries(), but with the windows held as four shifted views of a padded label array, so each test is
+        applied to every window at once and the counts are totalled per label with bincount.
+        '''
+        labels = np.array(self._get_padded_labels(), dtype=np.int64)
+        count = len(self)
+
+        def count_by_label(owners: np.ndarray, mask: np.ndarray) -> np.ndarray:
+            return np.bincount(owners[mask & (owners >= 0)], minlength=count)
+
+        perimeters = np.zeros(count, dtype=np.int64)
+        for (a, b) in [(labels[:, :-1], labels[:, 1:]), (labels[:-1, :], labels[1:, :])]:
+            differ = a != b
+            perimeters += count_by_label(a, differ) + count_by_label(b, differ)
+
+        window = (labels[:-1, :-1], labels[:-1, 1:], labels[1:, :-1], labels[1:, 1:])
+        sides = np.zeros(count, dtype=np.int64)
+        for (owner, horizontal, vertical, diagonal) in RegionLabels.WINDOW_CORNERS:
+            (o, h, v, d) = (window[owner], window[horizontal], window[vertical], window[diagonal])
+            convex = (o != h) & (o != v)
+            concave = (o == h) & (o == v) & (o != d)
+            sides += count_by_label(o, convex | concave)
+
+        self.perimeters = perimeters.tolist()
+        self.sides = sides.tolist()
+
+    def __len__(self):
+        return len(self.crops)
+
+    def get_label(self, point: (int, int)) -> int:
+        (x, y) = point
+        return self.labels[y * self.width + x]
 
 class GardenGroups:
     def __init__(self, filename: str):
         self.map = []
+        self._region_labels: RegionLabels|None = None
         self._load_data(filename)
 
     def _load_data(self, filename: str):
@@ -206,26 +408,23 @@ class GardenGroups:
         else:
             return None
 
-    def extract_points(self, point: (int, int), points: [(int, int)]=None) -> [(int, int)]:
-        if points is None:
-            points = []
-
-        if point in points:
-            return []
-
-        (x, y) = point
-
+    def extract_points(self, point: (int, int)) -> [(int, int)]:
+        '''
+        Flood fills the region containing the point, using an explicit stack (so large regions can't exceed the
+        recursion limit) and a set of the points found so far.
+        '''
         crop = self.get_crop(point)
-
-        points.append(point)
-
-        for dx_dy in dx_dy_list:
-            (dx, dy) = dx_dy
-            (x1, y1) = (x+dx, y+dy)
-            c1 = self.get_crop((x1, y1))
-            if c1 is not None and c1 == crop and (x1, y1) not in points:
-                points = self.extract_points(point=(x+dx, y+dy),
-                                             points=points)
+        points = [point]
+        found = {point}
+        stack = [point]
+        while stack:
+            (x, y) = stack.pop()
+            for (dx, dy) in dx_dy_list:
+                (x1, y1) = (x+dx, y+dy)
+                if (x1, y1) not in found and self.get_crop((x1, y1)) == crop:
+                    found.add((x1, y1))
+                    points.append((x1, y1))
+                    stack.append((x1, y1))
 
         return points
 
@@ -234,41 +433,29 @@ class GardenGroups:
         points = self.extract_points(point)
         return Region(crop=crop, points=points)
 
+    def get_region_labels(self) -> RegionLabels:
+        if self._region_labels is None:
+            self._region_labels = RegionLabels(self.map)
+        return self._region_labels
+
     def extract_regions(self) -> [Region]:
+        labels = self.get_region_labels()
         regions = Regions()
-
-        for y in range(0, self.height):
-            for x in range(0, self.width):
-                if regions.is_in_region((x, y)):
-                    continue
-                else:
-                    region = self.extract_region((x, y))
-                    regions.append(region)
+        for label in range(0, len(labels)):
+            regions.append(Region(crop=labels.crops[label],
+                                  points=labels.cells[label],
+                                  perimeter=labels.perimeters[label],
+                                  sides=labels.sides[label]))
 
         return regions
 
     def get_answer_1(self) -> int:
-        regions = self.extract_regions()
-        total_cost = 0
-        for region in regions:
-            area = region.area
-            perimeter = region.perimeter
-            cost = area*perimeter
-            total_cost += cost
-
-        return total_cost
-
+        labels = self.get_region_labels()
+        return sum(area * perimeter for area, perimeter in zip(labels.areas, labels.perimeters))
 
     def get_answer_2(self) -> int:
-        regions = self.extract_regions()
-        total_cost = 0
-        for region in regions:
-            area = region.area
-            sides = region.calculate_sides()
-            cost = area*sides
-            total_cost += cost
-
-        return total_cost
+        labels = self.get_region_labels()
+        return sum(area * sides for area, sides in zip(labels.areas, labels.sides))
 
 
 test1_solution = GardenGroups('test1.txt')
@@ -277,9 +464,12 @@ assert test1_solution.get_answer_2() == 80
 
 test2_solution = GardenGroups('test2.txt')
 assert test2_solution.get_answer_1() == 772
+assert test2_solution.get_answer_2() == 436
 
 test3_solution = GardenGroups('test3.txt')
 assert test3_solution.get_answer_1() == 1930
+assert test3_solution.get_answer_2() == 1206
+assert len(test3_solution.get_region_labels()) == 11
 
 solution_1 = GardenGroups('data.txt')
 answer_1 = solution_1.get_answer_1()